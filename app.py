@@ -1,9 +1,298 @@
+import hashlib
+import io
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pacsv
 import streamlit as st
 import pandas as pd
+from pandas.tseries.api import guess_datetime_format
 import plotly.express as px
+import plotly.io as pio
+
+# numba is optional; without it pandas uses its default Cython kernels and
+# column sums fall back to NumPy. parallel=True is left off: its threading
+# layer hangs when first started from Streamlit's script thread.
+try:
+    from numba import njit
+    GROUPBY_ENGINE = "numba"
+    GROUPBY_ENGINE_KWARGS = {"nogil": True}
+except ImportError:
+    njit = None
+    GROUPBY_ENGINE = None
+    GROUPBY_ENGINE_KWARGS = None
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M"
+RESAMPLE_RULES = {"Hourly": "h", "Daily": "D", "Weekly": "W", "Monthly": "ME"}
+# Shortest span of each rule's bins, used to bound how many bins a resample creates
+RULE_WIDTHS = {
+    "h": pd.Timedelta(hours=1),
+    "D": pd.Timedelta(days=1),
+    "W": pd.Timedelta(weeks=1),
+    "ME": pd.Timedelta(days=28),
+}
+MAX_BINS_PER_ROW = 100
+CSV_BLOCK_SIZE = 8 << 20  # bytes of CSV text per streamed record batch
+DEVICE_TYPES = ["Fan", "Light", "Fridge", "TV"]
+
+
+def parse_timestamps(df, timestamp_format=TIMESTAMP_FORMAT):
+    # One explicit layout for every row, so all streamed batches agree
+    if "Timestamp" in df.columns and not pd.api.types.is_datetime64_any_dtype(df["Timestamp"]):
+        df["Timestamp"] = pd.to_datetime(df["Timestamp"], format=timestamp_format, cache=True)
+    return df
+
+
+def infer_timestamp_format(values):
+    # Guess the layout from the first reading, as pandas does for a whole column
+    readings = values.dropna()
+    if pd.api.types.is_datetime64_any_dtype(values) or readings.empty:
+        return TIMESTAMP_FORMAT
+    if not isinstance(readings.iloc[0], str):
+        # Arrow already typed these (date-only values, epoch numbers), so there
+        # is no layout to guess; pd.to_datetime converts them directly
+        return None
+    timestamp_format = guess_datetime_format(readings.iloc[0])
+    if timestamp_format is None:
+        raise ValueError(f"Unsupported Timestamp layout: {readings.iloc[0]!r}")
+    return timestamp_format
+
+
+# Both loaders return the hourly sums and counts of every device column, the
+# kWh per device column, the number of readings and a content key for the
+# downstream caches; raw rows are not kept once they are binned
+@st.cache_data
+def load_csv(file_bytes: bytes) -> tuple:
+    # Stream the upload through Arrow's CSV reader and fold each record batch
+    # into hourly bins, so memory follows the number of hours, not rows. The
+    # header peek tells Arrow which columns hold float32 device readings.
+    header = pd.read_csv(io.BytesIO(file_bytes), nrows=0).columns
+    if "Timestamp" not in header:
+        raise ValueError("CSV must include a 'Timestamp' column.")
+    if len(header) < 2:
+        raise ValueError("CSV must include device columns like 'Fan (W)', 'Fridge (W)', etc.")
+    # Reuse the peeked names, which pandas has already made unique (a repeated
+    # "Fan (W)" becomes "Fan (W).1"), so duplicate headers keep their readings
+    read_options = pacsv.ReadOptions(column_names=list(header), skip_rows=1,
+                                     block_size=CSV_BLOCK_SIZE)
+    convert_options = pacsv.ConvertOptions(
+        column_types={c: pa.float32() for c in header if c != "Timestamp"},
+        # Only the plain local layout; Arrow would convert ISO 8601 offsets to
+        # UTC, so those are left as strings for pandas, which keeps the offset
+        timestamp_parsers=[TIMESTAMP_FORMAT],
+    )
+    reader = pacsv.open_csv(pa.BufferReader(file_bytes),
+                            read_options=read_options,
+                            convert_options=convert_options)
+    parts, undated_sums, records, timestamp_format = [], [], 0, None
+    for batch in reader:
+        chunk = batch.to_pandas()
+        # Infer the layout once from the first batch and reuse it for the rest,
+        # so an ambiguous day/month order cannot flip between batches
+        if timestamp_format is None:
+            timestamp_format = infer_timestamp_format(chunk["Timestamp"])
+        chunk = parse_timestamps(chunk, timestamp_format)
+        # Rows with a blank Timestamp cannot be binned; keep their energy
+        undated = chunk["Timestamp"].isna()
+        if undated.any():
+            undated_sums.append(chunk.loc[undated].drop(columns="Timestamp").sum())
+            chunk = chunk.loc[~undated]
+        if len(chunk):
+            parts.append(bin_power(chunk.set_index("Timestamp"), "h"))
+        records += batch.num_rows
+    if not parts:
+        raise ValueError("CSV has no readings with a Timestamp.")
+    # An hour can straddle two batches; re-binning merges those partial bins
+    hourly = rebin_power(pd.concat(parts), "h")
+    return (hourly, kwh_totals(hourly, undated_sums), records,
+            hashlib.sha256(file_bytes).hexdigest())
+
+
+@st.cache_data
+def load_sample() -> tuple:
+    df = parse_timestamps(pd.DataFrame({
+        "Timestamp": [
+            "2025-12-26 08:00","2025-12-26 09:00","2025-12-26 10:00",
+            "2025-12-26 11:00","2025-12-26 12:00","2025-12-26 13:00",
+            "2025-12-26 14:00","2025-12-26 15:00","2025-12-26 16:00"
+        ],
+        "Fan (W)": [120,100,130,90,110,95,105,115,98],
+        "Light (W)": [60,40,70,50,65,55,45,60,52],
+        "Fridge (W)": [200,220,210,230,205,215,225,210,220],
+        "TV (W)": [150,160,140,170,155,145,165,150,160]
+    }))
+    df = df.astype({c: np.float32 for c in df.columns if c != "Timestamp"})
+    hourly = bin_power(df.set_index("Timestamp"), "h")
+    return hourly, kwh_totals(hourly), len(df), "sample"
+
+
+# Per-column sums of a 2-D array, accumulated in float64
+if njit:
+    @njit(nogil=True, cache=True)
+    def sum_columns(a):
+        n, m = a.shape
+        out = np.zeros(m)
+        for j in range(m):
+            s = 0.0
+            for i in range(n):
+                s += a[i, j]
+            out[j] = s
+        return out
+else:
+    def sum_columns(a):
+        return a.sum(axis=0, dtype=np.float64)
+
+
+def kwh_totals(hourly, undated_sums=()):
+    # kWh per device column from the hourly sums; readings with a blank
+    # Timestamp fall outside every bin but still count as energy
+    wh = pd.Series(sum_columns(hourly["sum"].to_numpy(copy=False)), index=hourly["sum"].columns)
+    for sums in undated_sums:
+        wh += sums
+    return wh / 1000.0
+
+
+# Device type -> matching columns, built once per column layout
+@st.cache_data
+def device_column_map(columns: tuple) -> dict:
+    device_cols = [c for c in columns if c != "Timestamp"]
+    device_map = {k: [c for c in device_cols if k in c] for k in DEVICE_TYPES}
+    device_map["All"] = device_cols
+    return device_map
+
+
+def bin_labels(index, rule):
+    # The label resample would give each timestamp: hours and days start at the
+    # bin's left edge, weeks end on Sunday and months on their last day
+    if rule == "W":
+        day = index.normalize()
+        return day + pd.to_timedelta((6 - day.dayofweek) % 7, unit="D")
+    if rule == "ME":
+        return index.normalize() + pd.offsets.MonthEnd(0)
+    return index.floor(rule)
+
+
+def group_by_rule(frame, rule, reduce):
+    # A stray far-off timestamp (e.g. a mistyped year) or sparse readings would
+    # make resample emit one empty bin per period in between, so in that case
+    # group on each row's bin label instead, which only creates occupied bins
+    gap = RULE_WIDTHS[rule] * MAX_BINS_PER_ROW
+    if len(frame) and (frame.index.max() - frame.index.min()) / gap > len(frame):
+        return reduce(frame.groupby(bin_labels(frame.index, rule)))
+    return reduce(frame.groupby(pd.Grouper(freq=rule)))
+
+
+def bin_power(work, rule):
+    # Raw readings -> per-bin sums and counts
+    def sum_and_count(grouped):
+        return pd.concat({
+            "sum": grouped.sum(engine=GROUPBY_ENGINE, engine_kwargs=GROUPBY_ENGINE_KWARGS),
+            "count": grouped.count(),
+        }, axis=1)
+    return group_by_rule(work, rule, sum_and_count)
+
+
+def rebin_power(binned, rule):
+    # Hourly sums and counts nest inside every coarser bin, so adding them up
+    # gives the same result as binning the raw readings again
+    return group_by_rule(binned, rule, lambda grouped: grouped.sum())
+
+
+# Compile the numba kernels once per process instead of on the first real chart
+@st.cache_resource
+def warm_numba_kernels():
+    if njit:
+        index = pd.date_range("2025-01-01", periods=2, freq="h")
+        binned = bin_power(pd.DataFrame({"W": [0, 1]}, index=index, dtype=np.float32), "h")
+        sum_columns(binned["sum"].to_numpy(copy=False))
+
+
+# Cached per (data, devices, rule); `_hourly` is not hashed, `data_key` identifies it.
+# Bounded so a long-running server does not keep every upload's aggregates.
+@st.cache_data(max_entries=64)
+def resample_power(_hourly: pd.DataFrame, data_key: str, cols: tuple, rule: str):
+    # Mean power per bin from per-bin sums and counts; coarser views are
+    # derived from the hourly bins, not the raw rows
+    binned = _hourly.loc[:, pd.IndexSlice[:, list(cols)]]
+    if rule != "h":
+        binned = rebin_power(binned, rule)
+    return binned["sum"] / binned["count"]
+
+
+# Line charts for every time view are built together on first use, so
+# switching the view is a dict lookup; figures are shared, not copied, and
+# only the most recent datasets' figures are kept
+@st.cache_resource(max_entries=16)
+def build_line_charts(_hourly: pd.DataFrame, data_key: str, cols: tuple) -> dict:
+    charts = {}
+    for granularity, rule in RESAMPLE_RULES.items():
+        agg = resample_power(_hourly, data_key, cols, rule)
+        fig = px.line(agg, x=agg.index, y=list(cols), render_mode="webgl",
+                      labels={"value":"Power (W)","variable":"Device"})
+        # Keep zoom/legend state across reruns of the same view; a new time
+        # view or dataset gets a new revision and so a fresh x-range
+        fig.update_layout(uirevision=f"{data_key}-{granularity}")
+        charts[granularity] = fig
+    return charts
+
+
+# Bar and pie builders return serialized figures so reruns skip rebuilding them
+@st.cache_data
+def build_bar(kwh_per_device: pd.Series) -> str:
+    return px.bar(x=kwh_per_device.index, y=kwh_per_device.values,
+                  labels={"x":"Device","y":"Total kWh"}).to_json()
+
+
+@st.cache_data
+def build_pie(kwh_per_device: pd.Series) -> str:
+    return px.pie(values=kwh_per_device.values, names=kwh_per_device.index).to_json()
+
+
+# Export bytes are reused until the summary itself changes
+@st.cache_data
+def summary_to_csv(summary: pd.DataFrame) -> bytes:
+    return summary.to_csv().encode("utf-8")
+
+
+# Everything that depends on the tariff; changing it reruns only this fragment,
+# not the data loading and chart building in the main script
+@st.fragment
+def render_costs(kwh_per_device: pd.Series, records: int):
+    tariff = st.number_input("Tariff (₹ per kWh)", min_value=0.0, value=8.0, step=0.5)
+
+    # Totals: kWh comes cached with the aggregate, only costs follow the tariff
+    total_kwh = kwh_per_device.sum()
+    total_cost = total_kwh * tariff
+
+    # KPI cards
+    st.markdown("<div class='metric-container'>", unsafe_allow_html=True)
+    col1, col2, col3 = st.columns(3)
+    col1.metric("🔌 Total kWh", f"{total_kwh:.2f}")
+    col2.metric("💰 Estimated Cost", f"₹{total_cost:.2f}")
+    col3.metric("📁 Records", f"{records} rows")
+    st.markdown("</div>", unsafe_allow_html=True)
+
+    # Device breakdown table
+    st.subheader("📊 Device Breakdown")
+    summary = pd.DataFrame({
+        "Total kWh": kwh_per_device.round(3),
+        "Estimated Cost (INR)": (kwh_per_device * tariff).round(2)
+    })
+    st.dataframe(summary, use_container_width=True)
+
+    # Top contributors
+    st.subheader("🏆 Top Energy Consumers")
+    top_devices = summary.nlargest(3, "Total kWh")
+    st.table(top_devices)
+
+    # Export
+    st.subheader("📥 Export Summary")
+    st.download_button("Download Summary as CSV", summary_to_csv(summary), "summary.csv", "text/csv")
+
 
 # Page setup
 st.set_page_config(page_title="Smart Energy Monitoring Dashboard", layout="wide")
+warm_numba_kernels()
 
 # Load custom CSS theme
 with open("theme.css") as f:
@@ -21,112 +310,57 @@ st.markdown("<h1>⚡ Smart Energy Monitoring Dashboard</h1>", unsafe_allow_html=
 # Sidebar filters
 with st.sidebar:
     st.header("🔧 Filters")
-    device_type = st.selectbox("Device Type", ["All", "Fan", "Light", "Fridge", "TV"])
-    time_granularity = st.selectbox("Time View", ["Hourly", "Daily", "Weekly", "Monthly"])
-    tariff = st.number_input("Tariff (₹ per kWh)", min_value=0.0, value=8.0, step=0.5)
+    device_type = st.selectbox("Device Type", ["All"] + DEVICE_TYPES)
+    time_granularity = st.selectbox("Time View", list(RESAMPLE_RULES))
     data_option = st.radio("Data Source", ["Upload CSV", "Use Sample"])
     uploaded = None
     if data_option == "Upload CSV":
         uploaded = st.file_uploader("Upload CSV", type=["csv"])
 
 # Load data
-if data_option == "Upload CSV" and uploaded:
-    df = pd.read_csv(uploaded)
-elif data_option == "Use Sample":
-    df = pd.DataFrame({
-        "Timestamp": [
-            "2025-12-26 08:00","2025-12-26 09:00","2025-12-26 10:00",
-            "2025-12-26 11:00","2025-12-26 12:00","2025-12-26 13:00",
-            "2025-12-26 14:00","2025-12-26 15:00","2025-12-26 16:00"
-        ],
-        "Fan (W)": [120,100,130,90,110,95,105,115,98],
-        "Light (W)": [60,40,70,50,65,55,45,60,52],
-        "Fridge (W)": [200,220,210,230,205,215,225,210,220],
-        "TV (W)": [150,160,140,170,155,145,165,150,160]
-    })
-else:
-    st.info("Upload a CSV to proceed or switch to Sample CSV.")
+try:
+    if data_option == "Upload CSV" and uploaded:
+        hourly, kwh, records, data_key = load_csv(uploaded.getvalue())
+    elif data_option == "Use Sample":
+        hourly, kwh, records, data_key = load_sample()
+    else:
+        st.info("Upload a CSV to proceed or switch to Sample CSV.")
+        st.stop()
+except ValueError as err:
+    st.error(str(err))
     st.stop()
 
-# Validate and preprocess
-if "Timestamp" not in df.columns:
-    st.error("CSV must include a 'Timestamp' column.")
-    st.stop()
+# Map device types to their columns
+device_map = device_column_map(tuple(hourly["sum"].columns))
 
-df["Timestamp"] = pd.to_datetime(df["Timestamp"])
-device_cols = [c for c in df.columns if c != "Timestamp"]
+# Filter by device type
+device_cols = device_map[device_type]
 if not device_cols:
-    st.error("CSV must include device columns like 'Fan (W)', 'Fridge (W)', etc.")
+    st.warning(f"No data found for {device_type}")
     st.stop()
 
-# Filter by device type
-if device_type != "All":
-    device_cols = [col for col in device_cols if device_type in col]
-    if not device_cols:
-        st.warning(f"No data found for {device_type}")
-        st.stop()
-
 # Aggregate by time view
-work = df.copy().set_index("Timestamp")
-if time_granularity == "Hourly":
-    agg = work.resample("H").mean()
-elif time_granularity == "Daily":
-    agg = work.resample("D").mean()
-elif time_granularity == "Weekly":
-    agg = work.resample("W").mean()
-else:
-    agg = work.resample("M").mean()
-
-# Totals
-kwh_per_device = (work[device_cols].sum()) / 1000.0
-costs = kwh_per_device * tariff
-total_kwh = kwh_per_device.sum()
-total_cost = costs.sum()
-
-# KPI cards
-st.markdown("<div class='metric-container'>", unsafe_allow_html=True)
-col1, col2, col3 = st.columns(3)
-col1.metric("🔌 Total kWh", f"{total_kwh:.2f}")
-col2.metric("💰 Estimated Cost", f"₹{total_cost:.2f}")
-col3.metric("📁 Records", f"{len(df)} rows")
-st.markdown("</div>", unsafe_allow_html=True)
-
-# Device breakdown table
-st.subheader("📊 Device Breakdown")
-summary = pd.DataFrame({
-    "Total kWh": kwh_per_device.round(3),
-    "Estimated Cost (INR)": costs.round(2)
-})
-st.dataframe(summary, use_container_width=True)
+line_charts = build_line_charts(hourly, data_key, tuple(device_cols))
+kwh_per_device = kwh[device_cols]
+
+# Costs, KPIs, breakdown and export
+render_costs(kwh_per_device, records)
 
 # Charts in tabs
 st.subheader("📈 Visual Trends")
 tab1, tab2, tab3 = st.tabs(["Line Chart", "Bar Chart", "Pie Chart"])
 
 with tab1:
-    fig_line = px.line(agg.reset_index(), x="Timestamp", y=device_cols,
-                       labels={"value":"Power (W)","variable":"Device"})
-    st.plotly_chart(fig_line, use_container_width=True)
+    st.plotly_chart(line_charts[time_granularity], use_container_width=True)
 
 with tab2:
-    fig_bar = px.bar(x=kwh_per_device.index, y=kwh_per_device.values,
-                     labels={"x":"Device","y":"Total kWh"})
+    fig_bar = pio.from_json(build_bar(kwh_per_device))
     st.plotly_chart(fig_bar, use_container_width=True)
 
 with tab3:
-    fig_pie = px.pie(values=kwh_per_device.values, names=kwh_per_device.index)
+    fig_pie = pio.from_json(build_pie(kwh_per_device))
     st.plotly_chart(fig_pie, use_container_width=True)
 
-# Top contributors
-st.subheader("🏆 Top Energy Consumers")
-top_devices = summary.sort_values("Total kWh", ascending=False).head(3)
-st.table(top_devices)
-
-# Export
-st.subheader("📥 Export Summary")
-csv = summary.to_csv().encode("utf-8")
-st.download_button("Download Summary as CSV", csv, "summary.csv", "text/csv")
-
 # Footer
 st.markdown("""
     <hr style="margin-top:40px; margin-bottom:10px;">